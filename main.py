@@ -1,9 +1,12 @@
 import asyncio
 import json
+import math
 import os
 import re
+import time
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict
+from typing import Deque, Dict, Optional
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api.star import Context, Star, register
@@ -11,17 +14,44 @@ from astrbot.api import logger
 from astrbot.core.message.components import At
 
 
-@register("feihualing", "auberginewly", "支持LLM智能古诗检测的限时飞花令记分插件", "1.2.0")
+@register("feihualing", "auberginewly", "支持LLM智能古诗检测的限时飞花令记分插件", "1.3.0")
 class FeiHuaLingPlugin(Star):
     """飞花令插件
 
     支持多群/用户同时进行飞花令游戏，包含计时、积分、重复检测等功能
     """
 
-    def __init__(self, context: Context):
+    def __init__(self, context: Context, config: Optional[dict] = None):
         super().__init__(context)
+        self.config = config or {}
         # 存储游戏状态的字典，key为group_id或user_id
         self.games: Dict[str, dict] = {}
+
+        # 刷屏控制：限流配置（0 表示不限制）
+        self.user_rate_limit = self.get_config_value("user_rate_limit", 5, int, 0)
+        self.user_rate_window = self.get_config_value("user_rate_window", 30, int, 1)
+        self.session_rate_limit = self.get_config_value(
+            "session_rate_limit", 30, int, 0
+        )
+        self.session_rate_window = self.get_config_value(
+            "session_rate_window", 60, int, 1
+        )
+        self.reject_cooldown_samples = self.get_config_value(
+            "reject_cooldown_samples", 6, int, 0
+        )
+        self.reject_cooldown_ratio = self.get_config_value(
+            "reject_cooldown_ratio", 0.8, float, 0.01, 1.0
+        )
+        self.reject_cooldown_seconds = self.get_config_value(
+            "reject_cooldown_seconds", 60, int, 1
+        )
+        # 刷屏控制：运行状态，用户相关的key为 "session_id:user_id"
+        self.user_submissions: Dict[str, Deque[float]] = {}
+        self.session_submissions: Dict[str, Deque[float]] = {}
+        self.user_results: Dict[str, Deque[bool]] = {}
+        self.user_cooldowns: Dict[str, float] = {}
+        # 刷屏控制：按会话统计送检和被拦截的消息数量
+        self.flood_stats: Dict[str, Dict[str, int]] = {}
         # 数据存储路径
         self.data_dir = os.path.join("data", "feihualing")
         self.scores_file = os.path.join(self.data_dir, "scores.json")
@@ -33,6 +63,32 @@ class FeiHuaLingPlugin(Star):
         # 加载历史数据
         self.load_data()
 
+    def get_config_value(
+        self, key: str, default, cast, minimum, maximum=None
+    ):
+        """读取并校验数值配置，非法时记录警告并使用默认值"""
+        raw = self.config.get(key, default)
+        try:
+            if isinstance(raw, bool):
+                raise TypeError
+            value = float(raw)
+            if math.isnan(value) or math.isinf(value):
+                raise ValueError
+            if cast is int and not value.is_integer():
+                raise ValueError
+            value = cast(value)
+        except (TypeError, ValueError):
+            logger.warning(f"飞花令配置 {key}={raw!r} 不是有效数值，使用默认值 {default}")
+            return default
+
+        if value < minimum or (maximum is not None and value > maximum):
+            valid_range = f"{minimum}-{maximum}" if maximum is not None else f">={minimum}"
+            logger.warning(
+                f"飞花令配置 {key}={value} 超出范围({valid_range})，使用默认值 {default}"
+            )
+            return default
+        return value
+
     async def initialize(self):
         """插件初始化"""
         logger.info("飞花令插件初始化完成")
@@ -88,10 +144,10 @@ class FeiHuaLingPlugin(Star):
                 return True
         return False
 
-    async def is_valid_poem(self, text: str) -> bool:
-        """使用 LLM API 智能检查诗句有效性"""
-        logger.info(f"🔍 开始智能检查诗句: '{text}'")
-        
+    def passes_basic_check(self, text: str) -> bool:
+        """基础规则检查（长度、汉字、常见非诗句等），不调用 LLM"""
+        logger.info(f"🔍 开始检查诗句: '{text}'")
+
         if not text:
             logger.info("❌ 文本为空，返回False")
             return False
@@ -132,7 +188,12 @@ class FeiHuaLingPlugin(Star):
             logger.info(f"❌ 文本在非诗句排除列表中: {cleaned_text}")
             return False
 
-        logger.info("✅ 通过基础检查，开始LLM智能判断")
+        logger.info("✅ 通过基础检查")
+        return True
+
+    async def llm_check_poem(self, text: str) -> bool:
+        """使用 LLM API 判断已通过基础检查的文本是否为古诗词"""
+        logger.info("🤖 开始LLM智能判断")
 
         # 使用 LLM API 进行古诗判断
         try:
@@ -192,6 +253,92 @@ class FeiHuaLingPlugin(Star):
             logger.warning("🔄 LLM失败，回退到基础检查结果")
             return True
 
+    def get_flood_stats(self, session_id: str) -> Dict[str, int]:
+        """获取指定会话的刷屏控制统计"""
+        return self.flood_stats.setdefault(
+            session_id,
+            {"user_limited": 0, "session_limited": 0, "cooldown": 0, "checked": 0},
+        )
+
+    def count_flood(self, session_id: str, key: str):
+        """累加指定会话的刷屏控制统计"""
+        self.get_flood_stats(session_id)[key] += 1
+
+    def check_flood(self, session_id: str, user_id: str) -> Optional[str]:
+        """检查即将送入 LLM 检测的消息是否触发刷屏限制
+
+        只应对已通过基础检查的消息调用。通过检查时记录本次提交并返回None，否则返回拦截原因
+        （cooldown / user_limited / session_limited）
+        """
+        now = time.monotonic()
+        user_key = f"{session_id}:{user_id}"
+
+        # 冷却中的用户直接拦截
+        cooldown_until = self.user_cooldowns.get(user_key)
+        if cooldown_until is not None:
+            if now < cooldown_until:
+                self.count_flood(session_id, "cooldown")
+                return "cooldown"
+            del self.user_cooldowns[user_key]
+            self.user_results.pop(user_key, None)
+
+        # 两个滑动窗口都只记录实际送入 LLM 检测的消息，被拦截的消息不占用名额
+        user_times = self.user_submissions.setdefault(user_key, deque())
+        while user_times and now - user_times[0] >= self.user_rate_window:
+            user_times.popleft()
+        if self.user_rate_limit > 0 and len(user_times) >= self.user_rate_limit:
+            self.count_flood(session_id, "user_limited")
+            return "user_limited"
+
+        session_times = self.session_submissions.setdefault(session_id, deque())
+        while session_times and now - session_times[0] >= self.session_rate_window:
+            session_times.popleft()
+        if self.session_rate_limit > 0 and len(session_times) >= self.session_rate_limit:
+            self.count_flood(session_id, "session_limited")
+            return "session_limited"
+
+        if self.user_rate_limit > 0:
+            user_times.append(now)
+        if self.session_rate_limit > 0:
+            session_times.append(now)
+
+        self.count_flood(session_id, "checked")
+        return None
+
+    def record_submission_result(self, session_id: str, user_id: str, accepted: bool):
+        """记录用户提交结果，最近提交大多无效时让用户进入冷却"""
+        if self.reject_cooldown_samples <= 0:
+            return
+
+        user_key = f"{session_id}:{user_id}"
+        results = self.user_results.get(user_key)
+        if results is None:
+            results = deque(maxlen=self.reject_cooldown_samples)
+            self.user_results[user_key] = results
+        results.append(accepted)
+
+        if len(results) < self.reject_cooldown_samples:
+            return
+
+        rejected = results.count(False)
+        if rejected / len(results) >= self.reject_cooldown_ratio:
+            self.user_cooldowns[user_key] = (
+                time.monotonic() + self.reject_cooldown_seconds
+            )
+            results.clear()
+            logger.info(
+                f"🧊 用户 {user_id} 最近 {self.reject_cooldown_samples} 条提交中"
+                f"有 {rejected} 条无效，冷却 {self.reject_cooldown_seconds} 秒"
+            )
+
+    def clear_flood_state(self, session_id: str):
+        """清理指定会话的刷屏控制状态"""
+        prefix = f"{session_id}:"
+        for states in (self.user_submissions, self.user_results, self.user_cooldowns):
+            for key in [k for k in states if k.startswith(prefix)]:
+                del states[key]
+        self.session_submissions.pop(session_id, None)
+
     def contains_target_char(self, text: str, target_char: str) -> bool:
         """检查文本中是否包含指定令字"""
         return target_char in text
@@ -297,6 +444,7 @@ class FeiHuaLingPlugin(Star):
                 return None
 
             game["is_active"] = False
+            self.clear_flood_state(session_id)
 
             # 保存当局游戏数据到历史记录
             game_record = {
@@ -415,10 +563,52 @@ class FeiHuaLingPlugin(Star):
             ):
                 return
 
-            # 检查诗句有效性（使用 LLM 智能判断）
+            # 检查诗句有效性：先做基础规则检查，不消耗 LLM 调用
             logger.info(f"📝 用户 {user_name} 提交诗句: '{poem_text}'")
-            is_valid = await self.is_valid_poem(poem_text)
-            
+            is_valid = self.passes_basic_check(poem_text)
+
+            if is_valid:
+                # 刷屏控制：只限制即将送入 LLM 检测的消息，被限流的消息直接丢弃
+                flood_reason = self.check_flood(session_id, user_id)
+                if flood_reason:
+                    logger.info(f"🚧 用户 {user_name} 的消息被限流({flood_reason}): '{poem_text}'")
+                    # 如果是艾特机器人的消息，提示用户放慢速度
+                    if self.is_at_bot(event):
+                        if flood_reason == "cooldown":
+                            remaining = int(
+                                self.user_cooldowns[f"{session_id}:{user_id}"]
+                                - time.monotonic()
+                            )
+                            yield event.plain_result(
+                                f"🧊 {user_name}，你最近的无效提交过多，"
+                                f"请 {max(remaining, 1)} 秒后再试！"
+                            )
+                        elif flood_reason == "user_limited":
+                            yield event.plain_result(
+                                f"🚧 {user_name}，你提交得太快了！\n"
+                                f"💡 每 {self.user_rate_window} 秒最多提交 "
+                                f"{self.user_rate_limit} 句，请稍后再试"
+                            )
+                        else:
+                            yield event.plain_result(
+                                f"🚧 {user_name}，当前群内提交过于频繁！\n"
+                                f"💡 请稍等片刻再发送诗句"
+                            )
+                    return
+
+                # 使用 LLM 智能判断，仅 LLM 判定无效的提交计入冷却统计
+                is_valid = await self.llm_check_poem(poem_text)
+
+                # LLM 检测期间游戏可能已结束，避免把结果写入已重置的会话状态
+                if self.games.get(session_id) is not game or not game.get(
+                    "is_active", False
+                ):
+                    logger.info(f"⏹️ 游戏已结束，忽略诗句: '{poem_text}'")
+                    return
+
+                if not is_valid:
+                    self.record_submission_result(session_id, user_id, False)
+
             if not is_valid:
                 logger.info(f"❌ 诗句未通过验证: '{poem_text}'")
                 # 如果是艾特机器人的消息，给出提示
@@ -436,6 +626,7 @@ class FeiHuaLingPlugin(Star):
             # 检查是否包含令字
             if not self.contains_target_char(poem_text, game["target_char"]):
                 logger.info(f"❌ 诗句不含令字 '{game['target_char']}': '{poem_text}'")
+                self.record_submission_result(session_id, user_id, False)
                 # 如果是艾特机器人的消息或明显是诗句，给出提示
                 if (
                     self.is_at_bot(event)
@@ -456,6 +647,7 @@ class FeiHuaLingPlugin(Star):
             # 检查本轮是否已使用
             if cleaned_poem in game["used_poems"]:
                 logger.info(f"❌ 诗句重复: '{cleaned_poem}'")
+                self.record_submission_result(session_id, user_id, False)
                 yield event.plain_result(
                     f"❌ {user_name}，该诗句本轮已被使用过！\n"
                     f"📝 重复诗句：{poem_text}\n"
@@ -471,6 +663,7 @@ class FeiHuaLingPlugin(Star):
             if user_id not in game["participants"]:
                 game["participants"][user_id] = 0
             game["participants"][user_id] += 1
+            self.record_submission_result(session_id, user_id, True)
             
             logger.info(f"🎯 {user_name} 得分！当前分数: {game['participants'][user_id]}")
 
@@ -560,6 +753,50 @@ class FeiHuaLingPlugin(Star):
             logger.error(f"停止游戏失败: {e}")
             yield event.plain_result("停止游戏失败！")
 
+    @filter.command("feihualing_flood")
+    async def show_flood_stats(self, event: AstrMessageEvent):
+        """显示刷屏控制统计信息（当前会话）"""
+        try:
+            session_id = self.get_session_id(event)
+
+            # 检查是否有待发送的结束消息
+            if session_id in self.games:
+                game = self.games[session_id]
+                if not game.get("is_active", True) and game.get("end_message"):
+                    end_message = game["end_message"]
+                    del self.games[session_id]  # 清理游戏状态
+                    yield event.plain_result(end_message)
+                    return
+
+            stats = self.get_flood_stats(session_id)
+            shed = stats["user_limited"] + stats["session_limited"] + stats["cooldown"]
+            total = shed + stats["checked"]
+            shed_rate = shed / total * 100 if total else 0
+
+            # 确定是群聊还是私聊
+            chat_type = "群聊" if session_id.startswith("group_") else "私聊"
+
+            result = f"🚧 飞花令刷屏控制统计 ({chat_type}) 🚧\n\n"
+            result += f"LLM 送检诗句：{stats['checked']} 条\n"
+            result += f"用户限流拦截：{stats['user_limited']} 条\n"
+            result += f"会话限流拦截：{stats['session_limited']} 条\n"
+            result += f"冷却拦截：{stats['cooldown']} 条\n"
+            result += f"共拦截 {shed} 条（{shed_rate:.1f}%），未调用 LLM 检测\n"
+            result += "💡 统计自插件启动起，仅计入通过基础检查的诗句\n\n"
+            result += "⚙️ 当前限制：\n"
+            result += (
+                f"单用户：{self.user_rate_window} 秒内最多 {self.user_rate_limit} 条\n"
+                f"单会话：{self.session_rate_window} 秒内最多 {self.session_rate_limit} 条\n"
+                f"冷却：最近 {self.reject_cooldown_samples} 条中无效占比达 "
+                f"{self.reject_cooldown_ratio:.0%} 时冷却 {self.reject_cooldown_seconds} 秒"
+            )
+
+            yield event.plain_result(result)
+
+        except Exception as e:
+            logger.error(f"显示刷屏控制统计失败: {e}")
+            yield event.plain_result("获取刷屏控制统计失败！")
+
     @filter.command("feihualing_help")
     async def show_help(self, event: AstrMessageEvent):
         """显示帮助信息"""
@@ -585,6 +822,7 @@ class FeiHuaLingPlugin(Star):
 /feihualing_score - 查看总积分榜
 /feihualing_last - 查看最近一局排名
 /feihualing_stop - 强制结束游戏
+/feihualing_flood - 查看刷屏控制统计
 /feihualing_help - 显示此帮助
 
 🎯 游戏规则：
@@ -600,6 +838,7 @@ class FeiHuaLingPlugin(Star):
 - 单局内不能重复使用诗句
 - 不同群/用户的积分分别统计
 - 艾特机器人可获得无效输入提示
+- 短时间内提交过多或无效诗句过多会被暂时限流
 """
             yield event.plain_result(help_text)
 